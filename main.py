@@ -1,33 +1,75 @@
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, Depends
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List
+from typing import Dict, List
 import asyncio
+import os
+import socket
+import json
 import uvicorn
 
-from utils import ping, traceroute, is_valid_host
-from models import PingResult, TracerouteResult, TraceHop, HealthCheck, ErrorResponse
+from utils import ping, multiping, traceroute, is_valid_host, _IS_WINDOWS
+from models import PingResult, BulkPingResult, TracerouteResult, HealthCheck, ErrorResponse
+
+API_VERSION = "1.0.0"
+
+# IPs de los hosts permitidos, resueltas al arrancar y refrescadas periódicamente
+HOST_IPS: Dict[str, str] = {}
+DNS_REFRESH_SECONDS = 300
+
+async def resolve_allowed_hosts():
+    """Resuelve la IP de cada host permitido y actualiza HOST_IPS"""
+    ips = await asyncio.gather(
+        *(asyncio.to_thread(socket.gethostbyname, host) for host in _ALLOWED_HOSTS_SORTED),
+        return_exceptions=True
+    )
+    for host, ip in zip(_ALLOWED_HOSTS_SORTED, ips):
+        # Si la resolución falla se conserva la IP anterior (o el nombre)
+        if isinstance(ip, str):
+            HOST_IPS[host] = ip
+
+async def _refresh_dns():
+    while True:
+        await asyncio.sleep(DNS_REFRESH_SECONDS)
+        await resolve_allowed_hosts()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Resuelve los hosts permitidos al arrancar y los refresca en segundo plano"""
+    await resolve_allowed_hosts()
+    dns_refresh = asyncio.create_task(_refresh_dns())
+    try:
+        yield
+    finally:
+        dns_refresh.cancel()
 
 app = FastAPI(
     title="Connectivity API",
     description="API para verificar conectividad de red mediante ping y traceroute",
-    version="1.0.0",
+    version=API_VERSION,
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
+)
+
+# Configurar CORS: orígenes permitidos separados por comas en CORS_ORIGINS
+CORS_ORIGINS = tuple(
+    origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()
 )
 
-# Configurar CORS
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_origins=CORS_ORIGINS,
+    # Las credenciales no se admiten junto con el comodín "*"
+    allow_credentials="*" not in CORS_ORIGINS,
+    allow_methods=("GET", "POST"),
+    allow_headers=("Content-Type",),
 )
 
 # Lista de hosts permitidos por seguridad
-ALLOWED_HOSTS = {
+ALLOWED_HOSTS = frozenset({
     "1.1.1.1",
     "8.8.8.8", 
     "8.8.4.4",
@@ -38,14 +80,30 @@ ALLOWED_HOSTS = {
     "stackoverflow.com",
     "python.org",
     "fastapi.tiangolo.com"
+})
+_ALLOWED_HOSTS_SORTED = tuple(sorted(ALLOWED_HOSTS))
+
+# La lista blanca no cambia en tiempo de ejecución: se serializa una sola vez
+_ALLOWED_HOSTS_BYTES = json.dumps({
+    "allowed_hosts": _ALLOWED_HOSTS_SORTED,
+    "count": len(ALLOWED_HOSTS)
+}, separators=(",", ":")).encode()
+
+# Máximo de hosts por solicitud de ping masivo
+MAX_BULK_HOSTS = 64
+
+# Errores documentados en OpenAPI (formato de custom_http_exception_handler)
+_ERROR_RESPONSES = {
+    400: {"model": ErrorResponse, "description": "Host no permitido o no válido"},
+    500: {"model": ErrorResponse, "description": "Error ejecutando la prueba"}
 }
 
-def validate_host(host: str):
-    """Valida que el host esté permitido y sea válido"""
+def validate_host(host: str) -> str:
+    """Valida que el host esté permitido y sea válido y devuelve su IP"""
     if host not in ALLOWED_HOSTS:
         raise HTTPException(
             status_code=400,
-            detail=f"Host '{host}' no está permitido. Hosts permitidos: {sorted(ALLOWED_HOSTS)}"
+            detail=f"Host '{host}' no está permitido. Hosts permitidos: {list(_ALLOWED_HOSTS_SORTED)}"
         )
     
     if not is_valid_host(host):
@@ -53,29 +111,28 @@ def validate_host(host: str):
             status_code=400,
             detail=f"Host '{host}' no es válido"
         )
+    
+    return HOST_IPS.get(host, host)
+
+async def now() -> datetime:
+    """Marca de tiempo calculada una sola vez por solicitud"""
+    return datetime.now()
 
 @app.get("/", response_model=HealthCheck)
-async def root():
+async def root(ts: datetime = Depends(now)):
     """Endpoint de salud del servicio"""
-    return HealthCheck(
-        status="OK",
-        timestamp=datetime.now().isoformat(),
-        version="1.0.0"
-    )
+    return {"status": "OK", "timestamp": ts, "version": API_VERSION}
 
 @app.get("/health", response_model=HealthCheck)
-async def health_check():
+async def health_check(ts: datetime = Depends(now)):
     """Endpoint de verificación de salud"""
-    return HealthCheck(
-        status="healthy",
-        timestamp=datetime.now().isoformat(),
-        version="1.0.0"
-    )
+    return {"status": "healthy", "timestamp": ts, "version": API_VERSION}
 
-@app.get("/ping", response_model=PingResult)
+@app.get("/ping", response_model=PingResult, responses=_ERROR_RESPONSES)
 async def do_ping(
     host: str = Query(..., description="IP o nombre de dominio a verificar"),
-    count: int = Query(4, ge=1, le=10, description="Número de paquetes a enviar (1-10)")
+    count: int = Query(4, ge=1, le=10, description="Número de paquetes a enviar (1-10)"),
+    ts: datetime = Depends(now)
 ):
     """
     Ejecuta ping a un host específico
@@ -83,14 +140,10 @@ async def do_ping(
     - **host**: IP o nombre de dominio a verificar
     - **count**: Número de paquetes ICMP a enviar (1-10)
     """
-    validate_host(host)
+    address = validate_host(host)
     
     try:
-        # Ejecutar ping en un hilo separado para no bloquear
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, ping, host, count)
-        
-        return PingResult(**result)
+        return await ping(host, count, timestamp=ts, address=address)
     
     except Exception as e:
         raise HTTPException(
@@ -98,10 +151,11 @@ async def do_ping(
             detail=f"Error ejecutando ping: {str(e)}"
         )
 
-@app.get("/traceroute", response_model=TracerouteResult)
+@app.get("/traceroute", response_model=TracerouteResult, responses=_ERROR_RESPONSES)
 async def do_traceroute(
     host: str = Query(..., description="IP o nombre de dominio a trazar"),
-    max_hops: int = Query(30, ge=1, le=50, description="Número máximo de saltos (1-50)")
+    max_hops: int = Query(30, ge=1, le=50, description="Número máximo de saltos (1-50)"),
+    ts: datetime = Depends(now)
 ):
     """
     Ejecuta traceroute a un host específico
@@ -109,20 +163,16 @@ async def do_traceroute(
     - **host**: IP o nombre de dominio a trazar
     - **max_hops**: Número máximo de saltos permitidos (1-50)
     """
-    validate_host(host)
+    address = validate_host(host)
     
     try:
-        # Ejecutar traceroute en un hilo separado para no bloquear
-        loop = asyncio.get_event_loop()
-        hops_data = await loop.run_in_executor(None, traceroute, host, max_hops)
-        
-        hops = [TraceHop(**hop) for hop in hops_data]
+        hops_data = await traceroute(address, max_hops)
         
-        return TracerouteResult(
-            host=host,
-            hops=hops,
-            timestamp=datetime.now().isoformat()
-        )
+        return {
+            "host": host,
+            "hops": hops_data,
+            "timestamp": ts
+        }
     
     except Exception as e:
         raise HTTPException(
@@ -133,16 +183,13 @@ async def do_traceroute(
 @app.get("/allowed-hosts")
 async def get_allowed_hosts():
     """Obtiene la lista de hosts permitidos"""
-    return {
-        "allowed_hosts": sorted(ALLOWED_HOSTS),
-        "count": len(ALLOWED_HOSTS),
-        "timestamp": datetime.now().isoformat()
-    }
+    return Response(_ALLOWED_HOSTS_BYTES, media_type="application/json")
 
-@app.post("/ping/bulk")
+@app.post("/ping/bulk", response_model=BulkPingResult, responses=_ERROR_RESPONSES)
 async def bulk_ping(
     hosts: List[str] = Query(..., description="Lista de hosts a verificar"),
-    count: int = Query(4, ge=1, le=10, description="Número de paquetes por host")
+    count: int = Query(4, ge=1, le=10, description="Número de paquetes por host"),
+    ts: datetime = Depends(now)
 ):
     """
     Ejecuta ping a múltiples hosts simultáneamente
@@ -150,25 +197,22 @@ async def bulk_ping(
     - **hosts**: Lista de IPs o dominios a verificar
     - **count**: Número de paquetes ICMP a enviar por host
     """
-    if len(hosts) > 5:
+    if len(hosts) > MAX_BULK_HOSTS:
         raise HTTPException(
             status_code=400,
-            detail="Máximo 5 hosts permitidos por solicitud"
+            detail=f"Máximo {MAX_BULK_HOSTS} hosts permitidos por solicitud"
         )
     
     # Validar todos los hosts
-    for host in hosts:
-        validate_host(host)
+    addresses = [validate_host(host) for host in hosts]
     
     try:
         # Ejecutar ping a todos los hosts en paralelo
-        loop = asyncio.get_event_loop()
-        tasks = [loop.run_in_executor(None, ping, host, count) for host in hosts]
-        results = await asyncio.gather(*tasks)
+        results = await multiping(hosts, count, timestamp=ts, addresses=addresses)
         
         return {
-            "results": [PingResult(**result) for result in results],
-            "timestamp": datetime.now().isoformat()
+            "results": results,
+            "timestamp": ts
         }
     
     except Exception as e:
@@ -182,18 +226,27 @@ async def bulk_ping(
 async def custom_http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
-        content=ErrorResponse(
-            detail=exc.detail,
-            error_code=f"HTTP_{exc.status_code}",
-            timestamp=datetime.now().isoformat()
-        ).dict()
+        content={
+            "detail": exc.detail,
+            "error_code": f"HTTP_{exc.status_code}",
+            "timestamp": datetime.now().isoformat()
+        }
     )
 
 if __name__ == "__main__":
+    # Recarga automática solo en desarrollo: API_RELOAD=1 python main.py
+    reload = os.getenv("API_RELOAD") == "1"
+    # Un proceso por núcleo (la recarga automática solo admite uno)
+    workers = 1 if reload else int(os.getenv("API_WORKERS", os.cpu_count() or 1))
+    
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        log_level="info"
+        # uvloop no está disponible en Windows
+        loop="asyncio" if _IS_WINDOWS else "uvloop",
+        http="httptools",
+        reload=reload,
+        workers=workers,
+        log_level="info" if reload else "warning"
     )
\ No newline at end of file
@@ -1,4 +1,5 @@
 from pydantic import BaseModel, Field
+from datetime import datetime
 from typing import List, Optional
 
 class PingResult(BaseModel):
@@ -9,7 +10,11 @@ class PingResult(BaseModel):
     min_ms: float
     avg_ms: float
     max_ms: float
-    timestamp: str
+    timestamp: datetime
+
+class BulkPingResult(BaseModel):
+    results: List[PingResult]
+    timestamp: datetime
 
 class TraceHop(BaseModel):
     hop: int
@@ -19,14 +24,14 @@ class TraceHop(BaseModel):
 class TracerouteResult(BaseModel):
     host: str
     hops: List[TraceHop]
-    timestamp: str
+    timestamp: datetime
 
 class HealthCheck(BaseModel):
     status: str
-    timestamp: str
+    timestamp: datetime
     version: str
 
 class ErrorResponse(BaseModel):
     detail: str
     error_code: str
-    timestamp: str
\ No newline at end of file
+    timestamp: datetime
\ No newline at end of file
@@ -3,7 +3,15 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from fastapi.testclient import TestClient
+import asyncio
+import socket
+import time
+import utils
+import main
 from main import app
+from datetime import datetime
+from icmplib import Host, Hop, NameLookupError, SocketPermissionError
+from utils import is_valid_host, _parse_ping_linux, _parse_ping_windows, _hops_to_dicts
 
 client = TestClient(app)
 
@@ -66,16 +74,130 @@ def test_bulk_ping():
 
 def test_bulk_ping_too_many_hosts():
     """Test de ping masivo con demasiados hosts"""
-    hosts = ["8.8.8.8"] * 10
+    hosts = ["8.8.8.8"] * 65
     query = "&".join([f"hosts={host}" for host in hosts])
     response = client.post(f"/ping/bulk?{query}&count=2")
     assert response.status_code == 400
     data = response.json()
-    assert "Máximo 5 hosts" in data["detail"]
+    assert "Máximo 64 hosts" in data["detail"]
 
 def test_root_endpoint():
     """Test del endpoint raíz"""
     response = client.get("/")
     assert response.status_code == 200
     data = response.json()
-    assert data["status"] == "OK"
\ No newline at end of file
+    assert data["status"] == "OK"
+
+def test_is_valid_host():
+    """Test de validación de IPs y dominios"""
+    assert is_valid_host("8.8.8.8")
+    assert is_valid_host("google.com")
+    assert not is_valid_host("999.1.1.1")
+    assert not is_valid_host("8.8.8.8\n")
+    assert not is_valid_host("localhost")
+    assert not is_valid_host("google.com; rm -rf /")
+
+def test_parse_ping_output():
+    """Test del parseo de la salida del comando ping"""
+    ts = datetime.now()
+    linux = (
+        "4 packets transmitted, 3 received, 25% packet loss, time 3004ms\n"
+        "rtt min/avg/max/mdev = 10.1/11.2/12.3/0.8 ms\n"
+    )
+    data = _parse_ping_linux(linux, "8.8.8.8", 4, ts)
+    assert data["packet_loss"] == 25.0
+    assert data["packets_received"] == 3
+    assert (data["min_ms"], data["avg_ms"], data["max_ms"]) == (10.1, 11.2, 12.3)
+    
+    # iputils imprime la pérdida con decimales (%g)
+    linux = (
+        "3 packets transmitted, 2 received, 33.3333% packet loss, time 2003ms\n"
+        "rtt min/avg/max/mdev = 10.1/11.2/12.3/0.8 ms\n"
+    )
+    data = _parse_ping_linux(linux, "8.8.8.8", 3, ts)
+    assert data["packet_loss"] == 33.3333
+    assert data["packets_received"] == 2
+    
+    macos = (
+        "7 packets transmitted, 4 packets received, 42.9% packet loss\n"
+        "round-trip min/avg/max/stddev = 10.1/11.2/12.3/0.8 ms\n"
+    )
+    data = _parse_ping_linux(macos, "8.8.8.8", 7, ts)
+    assert data["packets_received"] == 4
+    assert data["max_ms"] == 12.3
+    
+    windows = (
+        "    Packets: Sent = 4, Received = 4, Lost = 0 (0% loss),\n"
+        "Approximate round trip times in milli-seconds:\n"
+        "    Minimum = 10ms, Maximum = 14ms, Average = 12ms\n"
+    )
+    data = _parse_ping_windows(windows, "8.8.8.8", 4, ts)
+    assert data["packet_loss"] == 0.0
+    assert data["packets_received"] == 4
+    assert (data["min_ms"], data["avg_ms"], data["max_ms"]) == (10.0, 12.0, 14.0)
+
+def test_traceroute_hops_mapping():
+    """Test del mapeo de saltos de icmplib, con saltos sin respuesta"""
+    hops = [
+        Hop("192.168.1.1", 1, [1.5], 1),
+        Hop("8.8.8.8", 1, [12.0], 4)
+    ]
+    data = _hops_to_dicts(hops)
+    assert [hop["hop"] for hop in data] == [1, 2, 3, 4]
+    assert data[0] == {"hop": 1, "host": "192.168.1.1", "rtt_ms": 1.5}
+    assert data[1] == {"hop": 2, "host": "timeout", "rtt_ms": None}
+    assert data[3]["host"] == "8.8.8.8"
+    assert _hops_to_dicts([]) == []
+
+def test_bulk_ping_host_error(monkeypatch):
+    """Test de ping masivo cuando falla uno de los hosts"""
+    async def fake_async_ping(address, count=4, **kwargs):
+        if address == "google.com":
+            raise NameLookupError(address)
+        return Host(address, count, [1.0, 2.0, 3.0][:count])
+    
+    monkeypatch.setattr(utils, "async_ping", fake_async_ping)
+    response = client.post("/ping/bulk?hosts=8.8.8.8&hosts=google.com&hosts=1.1.1.1&count=2")
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["host"] for result in results] == ["8.8.8.8", "google.com", "1.1.1.1"]
+    assert results[0]["packet_loss"] == 0.0 and results[0]["avg_ms"] == 1.5
+    assert results[1]["packet_loss"] == 100.0
+    assert results[2]["packets_received"] == 2
+
+def test_bulk_ping_socket_error(monkeypatch):
+    """Test de ping masivo sin permisos para abrir el socket ICMP"""
+    async def fake_ping(host, count=4, timeout=2, timestamp=None, address=None):
+        raise SocketPermissionError(False)
+    
+    monkeypatch.setattr(utils, "ping", fake_ping)
+    response = client.post("/ping/bulk?hosts=8.8.8.8&hosts=1.1.1.1&count=2")
+    assert response.status_code == 500
+    assert "Error ejecutando ping masivo" in response.json()["detail"]
+
+def test_startup_resolves_allowed_hosts(monkeypatch):
+    """Test de la resolución DNS de los hosts permitidos al arrancar"""
+    monkeypatch.setattr(main, "HOST_IPS", {})
+    monkeypatch.setattr(socket, "gethostbyname", lambda host: "203.0.113.7")
+    with TestClient(app):
+        assert main.validate_host("google.com") == "203.0.113.7"
+        assert main.HOST_IPS["github.com"] == "203.0.113.7"
+
+def test_ping_unresolved_host(monkeypatch):
+    """Test de ping a un nombre que no se puede resolver"""
+    async def fake_async_ping(address, **kwargs):
+        raise NameLookupError(address)
+    
+    monkeypatch.setattr(utils, "async_ping", fake_async_ping)
+    response = client.get("/ping?host=google.com&count=2")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["host"] == "google.com"
+    assert data["packet_loss"] == 100.0
+    assert data["packets_received"] == 0
+
+def test_traceroute_timeout(monkeypatch):
+    """Test del límite de tiempo total de traceroute"""
+    monkeypatch.setattr(utils, "icmp_traceroute", lambda *args, **kwargs: time.sleep(0.5))
+    monkeypatch.setattr(utils, "TRACEROUTE_TIMEOUT", 0.1)
+    assert asyncio.run(utils.traceroute("8.8.8.8")) == []
\ No newline at end of file
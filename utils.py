@@ -1,90 +1,184 @@
+import asyncio
+import functools
+import os
 import subprocess
 import re
 import platform
-import os
+import shutil
 from datetime import datetime
-from typing import Dict, List
-import socket
+from typing import Dict, List, Optional
+
+try:
+    from icmplib import async_ping, traceroute as icmp_traceroute, NameLookupError
+except ImportError:  # Sin icmplib se usa el binario ping del sistema
+    async_ping = icmp_traceroute = None
+
+_IS_WINDOWS = platform.system().lower() == "windows"
+
+# Con root se usan sockets ICMP raw; sin root, sockets DGRAM (requieren
+# net.ipv4.ping_group_range en Linux)
+_PRIVILEGED = hasattr(os, "geteuid") and os.geteuid() == 0
+
+# Máximo de pings simultáneos en un ping masivo
+BULK_CONCURRENCY = 32
+
+# Límites de traceroute: espera por salto y duración total (en segundos).
+# Con 1 s por salto, 50 saltos caben dentro del límite total
+TRACEROUTE_HOP_TIMEOUT = 1
+TRACEROUTE_TIMEOUT = 60
+
+# Ruta del binario ping resuelta una sola vez (solo modo subprocess)
+_PING_BIN = shutil.which("ping") or "ping"
 
-# Expresiones regulares para parsear ping
-PING_RE_LINUX = re.compile(r"min/avg/max.*= ([\d.]+)/([\d.]+)/([\d.]+)")
-PING_RE_WINDOWS = re.compile(r"Minimum = (\d+)ms, Maximum = (\d+)ms, Average = (\d+)ms")
-LOSS_RE = re.compile(r"(\d+)% packet loss|(\d+)% perdidos")
+# Expresiones regulares para parsear ping (solo modo subprocess): pérdida y
+# estadísticas de tiempo se extraen en una sola búsqueda
+_PING_LINUX_RE = re.compile(
+    r"(\d+) (?:packets )?received,(?: \+\d+ \w+,)* ([\d.]+)% packet loss"
+    r"(?:.*?min/avg/max.*?= ([\d.]+)/([\d.]+)/([\d.]+))?",
+    re.S
+)
+_PING_WINDOWS_RE = re.compile(
+    r"(?:Received|recibidos) = (\d+).*?\((\d+)% (?:loss|perdidos)\)"
+    r"(?:.*?Minimum = (\d+)ms, Maximum = (\d+)ms, Average = (\d+)ms)?",
+    re.S
+)
 
+# Expresiones regulares para validar IPv4 y nombres de dominio
+_IPV4_RE = re.compile(r"\d{1,3}(?:\.\d{1,3}){3}")
+_DOMAIN_RE = re.compile(r'[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+@functools.lru_cache(maxsize=256)
 def is_valid_host(host: str) -> bool:
     """Valida que el host sea una IP válida o un dominio válido"""
-    try:
-        socket.inet_aton(host)
-        return True
-    except socket.error:
-        # Si no es IP, verificar si es un dominio válido
-        if re.match(r'^[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', host):
-            return True
-        return False
+    if _IPV4_RE.fullmatch(host):
+        return all(int(octet) <= 255 for octet in host.split("."))
+    
+    # Si no es IP, verificar si es un dominio válido
+    return _DOMAIN_RE.fullmatch(host) is not None
+
+def _failed(host: str, count: int, timestamp: datetime) -> Dict:
+    """Resultado de un ping sin respuesta (100% de pérdida)"""
+    return {
+        "host": host,
+        "packets_transmitted": count,
+        "packets_received": 0,
+        "packet_loss": 100.0,
+        "min_ms": 0.0,
+        "avg_ms": 0.0,
+        "max_ms": 0.0,
+        "timestamp": timestamp
+    }
 
-def ping(host: str, count: int = 4, timeout: int = 2) -> Dict:
+def _host_to_dict(host: str, result, timestamp: datetime) -> Dict:
+    """Convierte un resultado de icmplib al formato de PingResult"""
+    return {
+        "host": host,
+        "packets_transmitted": result.packets_sent,
+        "packets_received": result.packets_received,
+        "packet_loss": result.packet_loss * 100,
+        "min_ms": result.min_rtt,
+        "avg_ms": result.avg_rtt,
+        "max_ms": result.max_rtt,
+        "timestamp": timestamp
+    }
+
+async def ping(
+    host: str,
+    count: int = 4,
+    timeout: int = 2,
+    timestamp: Optional[datetime] = None,
+    address: Optional[str] = None
+) -> Dict:
     """
     Ejecuta ping a un host específico
+
+    Si se indica `address` (IP ya resuelta) se envían los paquetes a ella,
+    pero el resultado se reporta con el nombre `host`.
+    """
+    timestamp = timestamp or datetime.now()
+    address = address or host
+    
+    if async_ping is None:
+        return await asyncio.to_thread(_ping_subprocess, address, count, timeout, timestamp, host)
+    
+    try:
+        result = await async_ping(address, count=count, timeout=timeout, privileged=_PRIVILEGED)
+    except NameLookupError:
+        # Igual que con el binario ping: un nombre sin resolver es 100% de pérdida
+        return _failed(host, count, timestamp)
+    
+    return _host_to_dict(host, result, timestamp)
+
+async def multiping(
+    hosts: List[str],
+    count: int = 4,
+    timeout: int = 2,
+    timestamp: Optional[datetime] = None,
+    addresses: Optional[List[str]] = None
+) -> List[Dict]:
     """
-    system = platform.system().lower()
+    Ejecuta ping a varios hosts en paralelo con concurrencia acotada
+    """
+    timestamp = timestamp or datetime.now()
+    addresses = addresses or hosts
+    semaphore = asyncio.Semaphore(BULK_CONCURRENCY)
+    
+    async def _limited_ping(host: str, address: str) -> Dict:
+        async with semaphore:
+            return await ping(host, count, timeout, timestamp, address)
+    
+    # Si la solicitud se cancela, el TaskGroup cancela los pings en curso.
+    # ping() ya reporta los fallos de cada host como 100% de pérdida; el resto
+    # de errores (permisos del socket, dirección inválida) cancelan el lote y
+    # se propagan tal cual al endpoint
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [
+                tg.create_task(_limited_ping(host, address))
+                for host, address in zip(hosts, addresses)
+            ]
+    except ExceptionGroup as group:
+        raise group.exceptions[0]
     
-    if system == "windows":
-        cmd = ["ping", "-n", str(count), "-w", str(timeout * 1000), host]
+    return [task.result() for task in tasks]
+
+def _ping_subprocess(address: str, count: int, timeout: int, timestamp: datetime, host: str) -> Dict:
+    """
+    Ejecuta ping usando el binario del sistema (sin icmplib)
+    """
+    if _IS_WINDOWS:
+        cmd = [_PING_BIN, "-n", str(count), "-w", str(timeout * 1000), address]
     else:
-        cmd = ["ping", "-c", str(count), "-W", str(timeout), host]
+        cmd = [_PING_BIN, "-c", str(count), "-W", str(timeout), address]
     
     try:
         proc = subprocess.run(cmd, text=True, capture_output=True, timeout=30)
         output = proc.stdout
         
         if proc.returncode != 0:
-            return {
-                "host": host,
-                "packets_transmitted": count,
-                "packets_received": 0,
-                "packet_loss": 100.0,
-                "min_ms": 0.0,
-                "avg_ms": 0.0,
-                "max_ms": 0.0,
-                "timestamp": datetime.now().isoformat()
-            }
+            return _failed(host, count, timestamp)
         
         # Parsear resultados según el SO
-        if system == "windows":
-            return _parse_ping_windows(output, host, count)
+        if _IS_WINDOWS:
+            return _parse_ping_windows(output, host, count, timestamp)
         else:
-            return _parse_ping_linux(output, host, count)
+            return _parse_ping_linux(output, host, count, timestamp)
             
     except subprocess.TimeoutExpired:
-        return {
-            "host": host,
-            "packets_transmitted": count,
-            "packets_received": 0,
-            "packet_loss": 100.0,
-            "min_ms": 0.0,
-            "avg_ms": 0.0,
-            "max_ms": 0.0,
-            "timestamp": datetime.now().isoformat()
-        }
+        return _failed(host, count, timestamp)
 
-def _parse_ping_linux(output: str, host: str, count: int) -> Dict:
+def _parse_ping_linux(output: str, host: str, count: int, timestamp: datetime) -> Dict:
     """Parsea la salida de ping en sistemas Linux/macOS"""
     try:
-        # Buscar estadísticas de tiempo
-        time_match = PING_RE_LINUX.search(output)
-        if time_match:
-            min_ms, avg_ms, max_ms = map(float, time_match.groups())
-        else:
-            min_ms = avg_ms = max_ms = 0.0
+        loss = min_ms = avg_ms = max_ms = 0.0
+        packets_received = count
         
-        # Buscar pérdida de paquetes
-        loss_match = LOSS_RE.search(output)
-        if loss_match:
-            loss = float(loss_match.group(1))
-        else:
-            loss = 0.0
-        
-        packets_received = count - int(count * loss / 100)
+        match = _PING_LINUX_RE.search(output)
+        if match:
+            packets_received = int(match.group(1))
+            loss = float(match.group(2))
+            if match.group(3):
+                min_ms, avg_ms, max_ms = map(float, match.group(3, 4, 5))
         
         return {
             "host": host,
@@ -94,38 +188,23 @@ def _parse_ping_linux(output: str, host: str, count: int) -> Dict:
             "min_ms": min_ms,
             "avg_ms": avg_ms,
             "max_ms": max_ms,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         }
     except Exception:
-        return {
-            "host": host,
-            "packets_transmitted": count,
-            "packets_received": 0,
-            "packet_loss": 100.0,
-            "min_ms": 0.0,
-            "avg_ms": 0.0,
-            "max_ms": 0.0,
-            "timestamp": datetime.now().isoformat()
-        }
+        return _failed(host, count, timestamp)
 
-def _parse_ping_windows(output: str, host: str, count: int) -> Dict:
+def _parse_ping_windows(output: str, host: str, count: int, timestamp: datetime) -> Dict:
     """Parsea la salida de ping en sistemas Windows"""
     try:
-        # Buscar estadísticas de tiempo
-        time_match = PING_RE_WINDOWS.search(output)
-        if time_match:
-            min_ms, max_ms, avg_ms = map(float, time_match.groups())
-        else:
-            min_ms = avg_ms = max_ms = 0.0
-        
-        # Buscar pérdida de paquetes
-        loss_match = LOSS_RE.search(output)
-        if loss_match:
-            loss = float(loss_match.group(1) or loss_match.group(2))
-        else:
-            loss = 0.0
+        loss = min_ms = avg_ms = max_ms = 0.0
+        packets_received = count
         
-        packets_received = count - int(count * loss / 100)
+        match = _PING_WINDOWS_RE.search(output)
+        if match:
+            packets_received = int(match.group(1))
+            loss = float(match.group(2))
+            if match.group(3):
+                min_ms, max_ms, avg_ms = map(float, match.group(3, 4, 5))
         
         return {
             "host": host,
@@ -135,143 +214,52 @@ def _parse_ping_windows(output: str, host: str, count: int) -> Dict:
             "min_ms": min_ms,
             "avg_ms": avg_ms,
             "max_ms": max_ms,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": timestamp
         }
     except Exception:
-        return {
-            "host": host,
-            "packets_transmitted": count,
-            "packets_received": 0,
-            "packet_loss": 100.0,
-            "min_ms": 0.0,
-            "avg_ms": 0.0,
-            "max_ms": 0.0,
-            "timestamp": datetime.now().isoformat()
-        }
+        return _failed(host, count, timestamp)
 
-def traceroute(host: str, max_hops: int = 30) -> List[Dict]:
+async def traceroute(host: str, max_hops: int = 30) -> List[Dict]:
     """
     Ejecuta traceroute a un host específico
     """
-    system = platform.system().lower()
-    
-    if system == "windows":
-        # En Windows el comando es tracert y suele estar en el PATH
-        cmd = ["tracert", "-h", str(max_hops), host]
-    else:
-        # En Linux/Unix buscar traceroute en ubicaciones comunes
-        traceroute_paths = [
-            "traceroute",           # Si está en el PATH
-            "/usr/bin/traceroute",  # Ubicación común
-            "/usr/sbin/traceroute", # Ubicación en algunas distros
-            "/bin/traceroute"       # Otra ubicación posible
-        ]
-        
-        # Encontrar el primer path que exista
-        traceroute_path = None
-        for path in traceroute_paths:
-            try:
-                # Verificar si el comando existe y es ejecutable
-                if path == "traceroute":
-                    # Comprobar si está en el PATH
-                    result = subprocess.run(["which", "traceroute"], 
-                                           capture_output=True, text=True, check=False)
-                    if result.returncode == 0:
-                        traceroute_path = "traceroute"
-                        break
-                elif os.path.isfile(path) and os.access(path, os.X_OK):
-                    traceroute_path = path
-                    break
-            except:
-                continue
-        
-        # Si no se encuentra, usar el valor por defecto
-        if not traceroute_path:
-            traceroute_path = "traceroute"  # Intentar con el comando básico
-            
-        cmd = [traceroute_path, "-n", "-m", str(max_hops), host]
+    if icmp_traceroute is None:
+        raise RuntimeError("traceroute requiere icmplib instalado")
     
+    # icmplib no ofrece una versión asíncrona de traceroute
     try:
-        proc = subprocess.run(cmd, text=True, capture_output=True, timeout=60)
-        output = proc.stdout
-        
-        if system == "windows":
-            return _parse_traceroute_windows(output)
-        else:
-            return _parse_traceroute_linux(output)
-            
-    except subprocess.TimeoutExpired:
+        hops = await asyncio.wait_for(
+            asyncio.to_thread(
+                icmp_traceroute,
+                host,
+                count=1,
+                timeout=TRACEROUTE_HOP_TIMEOUT,
+                max_hops=max_hops,
+                fast=True
+            ),
+            timeout=TRACEROUTE_TIMEOUT
+        )
+    except asyncio.TimeoutError:
         return []
-
-def _parse_traceroute_linux(output: str) -> List[Dict]:
-    """Parsea la salida de traceroute en sistemas Linux/macOS"""
-    hops = []
-    lines = output.splitlines()
     
-    for line in lines[1:]:  # Saltar la primera línea
-        if not line.strip():
-            continue
-            
-        parts = line.split()
-        if len(parts) < 2:
-            continue
-            
-        try:
-            hop_no = int(parts[0])
-            
-            if parts[1] == "*":
-                hops.append({
-                    "hop": hop_no,
-                    "host": "timeout",
-                    "rtt_ms": None
-                })
-            else:
-                host_ip = parts[1]
-                rtt_ms = float(parts[2]) if len(parts) > 2 else None
-                hops.append({
-                    "hop": hop_no,
-                    "host": host_ip,
-                    "rtt_ms": rtt_ms
-                })
-        except (ValueError, IndexError):
-            continue
-    
-    return hops
+    return _hops_to_dicts(hops)
 
-def _parse_traceroute_windows(output: str) -> List[Dict]:
-    """Parsea la salida de tracert en sistemas Windows"""
-    hops = []
-    lines = output.splitlines()
+def _hops_to_dicts(hops) -> List[Dict]:
+    """
+    Convierte los saltos de icmplib al formato de TraceHop
+
+    icmplib solo devuelve los saltos que respondieron; los intermedios sin
+    respuesta se rellenan como "timeout" para mantener la numeración.
+    """
+    by_distance = {hop.distance: hop for hop in hops}
+    last = max(by_distance, default=0)
     
-    for i, line in enumerate(lines):
-        if line.strip().startswith(str(i + 1)):
-            try:
-                parts = line.split()
-                hop_no = int(parts[0])
-                
-                # Buscar IP en la línea
-                ip_pattern = r'\d+\.\d+\.\d+\.\d+'
-                ip_match = re.search(ip_pattern, line)
-                
-                if ip_match:
-                    host_ip = ip_match.group()
-                    # Buscar tiempo de respuesta
-                    time_pattern = r'(\d+)\s*ms'
-                    time_matches = re.findall(time_pattern, line)
-                    rtt_ms = float(time_matches[0]) if time_matches else None
-                    
-                    hops.append({
-                        "hop": hop_no,
-                        "host": host_ip,
-                        "rtt_ms": rtt_ms
-                    })
-                else:
-                    hops.append({
-                        "hop": hop_no,
-                        "host": "timeout",
-                        "rtt_ms": None
-                    })
-            except (ValueError, IndexError):
-                continue
+    result = []
+    for distance in range(1, last + 1):
+        hop = by_distance.get(distance)
+        if hop is None:
+            result.append({"hop": distance, "host": "timeout", "rtt_ms": None})
+        else:
+            result.append({"hop": distance, "host": hop.address, "rtt_ms": hop.avg_rtt})
     
-    return hops
\ No newline at end of file
+    return result